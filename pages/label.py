@@ -1,6 +1,15 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import hashlib
 import io
+import json
+import os
+import functools
+import queue
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, ImageDraw, ImageFont
 import zipfile
 from datetime import datetime
@@ -13,6 +22,26 @@ try:
 except ImportError:
     BARCODE_AVAILABLE = False
 
+# Prefer the Rust-based calamine engine for xlsx parsing when available
+try:
+    import python_calamine  # noqa: F401
+    _XL_ENGINE = "calamine"
+except ImportError:
+    _XL_ENGINE = "openpyxl"
+
+# Try to import numba for JIT-compiled bar-pattern kernels
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Opt-in 2x supersampling (render large, LANCZOS downscale) for users who
+# want extra-smooth text; quality gains plateau past 2x while pixel work
+# grows with the square of the factor, so direct-size rendering is the
+# default
+HQ_MODE = False
+
 # Page configuration
 try:
     st.set_page_config(
@@ -121,6 +150,10 @@ def render_sidebar():
     if st.session_state.uploaded_data is not None:
         st.sidebar.success("✅ Data Uploaded")
         st.sidebar.write(f"📊 {len(st.session_state.uploaded_data)} rows")
+    elif st.session_state.get('uploaded_file_bytes') is not None:
+        # Uploaded but not yet fully parsed (that happens lazily on the
+        # configure page); don't force the parse just for a row count
+        st.sidebar.success("✅ Data Uploaded")
     else:
         st.sidebar.info("📤 Upload Excel file first")
     
@@ -158,6 +191,68 @@ def render_sidebar():
         st.session_state.current_page = 'history'
         st.rerun()
 
+@st.cache_data(show_spinner=False)
+def _load_dataframe(name, data):
+    """Parse an uploaded workbook/CSV once per unique file (cached)
+
+    Streamlit reruns the whole script per widget interaction, so without
+    the cache a multi-MB xlsx would be re-parsed on every click.
+    """
+    # calamine parses xlsx in Rust, several times faster than the default
+    # openpyxl engine (which stays as the fallback)
+    if name.endswith('.csv'):
+        df = pd.read_csv(io.BytesIO(data))
+    else:
+        df = pd.read_excel(io.BytesIO(data), engine=_XL_ENGINE)
+
+    # Clean column names here so the cached frame is the cleaned one
+    df.columns = df.columns.str.strip()
+    return df
+
+@st.cache_data(show_spinner=False)
+def _load_dataframe_head(name, data):
+    """Parse just the first rows of an upload for the preview (cached)
+
+    Keeps the upload page snappy on large workbooks: the preview tables
+    only need a handful of rows, so the full parse is deferred until a
+    page that actually consumes every row.
+    """
+    if name.endswith('.csv'):
+        df = pd.read_csv(io.BytesIO(data), nrows=200)
+    else:
+        df = pd.read_excel(io.BytesIO(data), engine=_XL_ENGINE, nrows=200)
+
+    df.columns = df.columns.str.strip()
+    return df
+
+def _full_data():
+    """The full uploaded DataFrame, materialized on first use.
+
+    The upload page only stores the raw bytes plus a fast preview; the
+    configure/preview/generate pages call this to trigger (and then
+    reuse) the one full parse.
+    """
+    if st.session_state.uploaded_data is None:
+        raw = st.session_state.get('uploaded_file_bytes')
+        if raw is not None:
+            st.session_state.uploaded_data = _load_dataframe(
+                st.session_state.uploaded_file_name, raw)
+    return st.session_state.uploaded_data
+
+@st.cache_data(show_spinner=False)
+def build_column_info(df):
+    """Build the column/sample-data preview table (cached per upload)"""
+    # Materialize only the top rows and stringify them column-wise in one
+    # pass instead of running a full-column dropna scan per column
+    head = df.head(2)
+    samples = head.astype(str).where(head.notna())
+    sample_text = samples.apply(lambda s: ', '.join(v[:25] for v in s.dropna()))
+
+    return pd.DataFrame({
+        'Column': sample_text.index,
+        'Sample Data': sample_text.values
+    })
+
 def upload_data_page():
     """Handle file upload and data preview"""
     st.markdown('<div class="step-header"><h2>Step 1: Upload Your Excel Data</h2></div>', unsafe_allow_html=True)
@@ -175,36 +270,30 @@ def upload_data_page():
         
         if uploaded_file is not None:
             try:
-                # Read file based on extension
-                if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(uploaded_file)
-                else:
-                    df = pd.read_excel(uploaded_file)
-                
-                # Clean column names
-                df.columns = df.columns.str.strip()
-                
-                # Store in session state
-                st.session_state.uploaded_data = df
-                
-                st.success(f"✅ Successfully uploaded {len(df)} rows with {len(df.columns)} columns")
-                
+                # Stash only the raw bytes when the uploaded file's
+                # identity changes; the full parse is deferred to the
+                # first page that needs every row (see _full_data)
+                if st.session_state.get('uploaded_file_id') != uploaded_file.file_id:
+                    st.session_state.uploaded_file_name = uploaded_file.name
+                    st.session_state.uploaded_file_bytes = uploaded_file.getvalue()
+                    st.session_state.uploaded_file_id = uploaded_file.file_id
+                    st.session_state.uploaded_data = None
+
+                # Fast nrows-limited parse: upload feedback stays constant
+                # time no matter how large the workbook is
+                df = _load_dataframe_head(st.session_state.uploaded_file_name,
+                                          st.session_state.uploaded_file_bytes)
+
+                row_note = f"{len(df)}" if len(df) < 200 else "200+"
+                st.success(f"✅ Successfully uploaded {row_note} rows with {len(df.columns)} columns")
+
                 # Show preview
                 st.subheader("Data Preview")
                 st.dataframe(df.head(10), use_container_width=True)
-                
-                # Show column info
+
+                # Show column info (cached so reruns skip the rebuild)
                 st.subheader("Available Columns")
-                col_info = []
-                for col in df.columns:
-                    sample_values = df[col].dropna().head(2).tolist()
-                    sample_text = ', '.join([str(v)[:25] for v in sample_values])
-                    col_info.append({
-                        'Column': col,
-                        'Sample Data': sample_text
-                    })
-                
-                st.dataframe(pd.DataFrame(col_info), use_container_width=True)
+                st.dataframe(build_column_info(df), use_container_width=True)
                 
                 st.info("✅ **Next:** Click 'Configure Labels' in the sidebar to set up your label variables.")
                 
@@ -213,38 +302,42 @@ def upload_data_page():
     
     with col2:
         st.subheader("Sample Template")
-        if st.button("📄 Download Sample"):
-            sample_data = {
-                'Product_Name': ['Widget A', 'Gadget B', 'Tool C'],
-                'SKU': ['SKU001', 'SKU002', 'SKU003'],
-                'Price': ['$29.99', '$45.50', '$12.75'],
-                'Barcode_Value': ['123456789', '987654321', '456789123']
-            }
-            
-            sample_df = pd.DataFrame(sample_data)
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                sample_df.to_excel(writer, sheet_name='Sample', index=False)
-            
-            st.download_button(
-                "⬇️ Download Sample.xlsx",
-                data=output.getvalue(),
-                file_name="Sample_Template.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+        # Direct download button (no st.button gate, which needed a second
+        # click); the xlsx blob is cached so reruns reuse the same bytes
+        st.download_button(
+            "📄 Download Sample.xlsx",
+            data=_sample_xlsx_bytes(),
+            file_name="Sample_Template.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+
+@st.cache_data(show_spinner=False)
+def _sample_xlsx_bytes():
+    """Serialize the sample template workbook once (cached)"""
+    sample_data = {
+        'Product_Name': ['Widget A', 'Gadget B', 'Tool C'],
+        'SKU': ['SKU001', 'SKU002', 'SKU003'],
+        'Price': ['$29.99', '$45.50', '$12.75'],
+        'Barcode_Value': ['123456789', '987654321', '456789123']
+    }
+
+    sample_df = pd.DataFrame(sample_data)
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        sample_df.to_excel(writer, sheet_name='Sample', index=False)
+
+    return output.getvalue()
 
 def configure_labels_page():
     """Configure label variables and barcode settings"""
     st.markdown('<div class="step-header"><h2>Step 2: Configure Label Variables</h2></div>', unsafe_allow_html=True)
     
-    if st.session_state.uploaded_data is None:
+    df = _full_data()
+    if df is None:
         st.warning("⚠️ Please upload your Excel data first!")
         st.info("👈 Click 'Upload Data' in the sidebar")
         return
-    
-    df = st.session_state.uploaded_data
-    available_columns = list(df.columns)
-    
+
     col1, col2 = st.columns([2, 1])
     
     with col1:
@@ -256,7 +349,7 @@ def configure_labels_page():
         
         selected_vars = st.multiselect(
             "Choose which columns to include in your labels:",
-            available_columns,
+            df.columns,  # the Index is a valid options sequence; no list() copy
             default=current_selection,
             help="Select columns that should appear on your labels",
             key="variable_multiselect"
@@ -277,9 +370,10 @@ def configure_labels_page():
             # Remove variables no longer selected
             updated_order = [var for var in current_order if var in selected_vars]
             st.session_state.label_config['variable_order'] = updated_order
-            
-            # Force a rerun to sync the UI
-            st.rerun()
+
+            # No rerun needed: state is updated before the configuration
+            # blocks below render, so this same pass shows the new
+            # selection — a forced second execution only doubled latency
         
         # Show current selection status
         if selected_vars:
@@ -288,11 +382,32 @@ def configure_labels_page():
             # Configure each variable
             st.subheader("Variable Configuration")
             variable_order = st.session_state.label_config.get('variable_order', selected_vars)
-            
-            for i, var_name in enumerate(variable_order):
-                if var_name in selected_vars:  # Only show if still selected
-                    render_variable_config(var_name, i, df)
-            
+
+            # Reordering has to apply immediately (and st.button is not
+            # allowed inside st.form), so the ↑/↓ controls stay outside
+            render_variable_reorder(variable_order, selected_vars)
+
+            # Per-variable sample text computed once from the head of the
+            # frame instead of a full-column dropna scan per config row
+            head = df.head(2)
+            samples = {c: ', '.join(str(v)[:15] for v in head[c].dropna().tolist())
+                       for c in selected_vars if c in df.columns}
+
+            # Batch the font/style/new-line edits into a single rerun:
+            # one data_editor replaces the 5-widget row per variable (the
+            # form defers the rerun until Apply, the editor collapses N
+            # sliders/selectboxes/checkboxes into a single widget)
+            with st.form("variable_config"):
+                edited_settings = render_variable_settings_editor(
+                    variable_order, selected_vars, samples)
+                st.form_submit_button("Apply settings")
+
+            # Single assignment (merging keeps settings of deselected
+            # variables) rather than one mutation per variable
+            st.session_state.label_config['variable_settings'] = {
+                **st.session_state.label_config['variable_settings'],
+                **edited_settings}
+
             # Barcode configuration
             st.subheader("Barcode Configuration")
             render_barcode_config(selected_vars)
@@ -357,82 +472,76 @@ def configure_labels_page():
             st.success("✅ Configuration saved!")
             st.info("👈 Click 'Preview & Design' to see your label")
 
-def render_variable_config(var_name, index, df):
-    """Render configuration for a single variable"""
-    with st.container():
-        st.markdown(f'<div class="variable-config">', unsafe_allow_html=True)
-        
-        col1, col2, col3, col4, col5 = st.columns([0.5, 3, 1.2, 1.2, 1.1])
-        
-        # Move up/down buttons with better key management
-        with col1:
-            current_order = st.session_state.label_config.get('variable_order', [])
-            
-            if index > 0 and st.button("↑", key=f"up_{var_name}_{index}"):
-                if var_name in current_order:
-                    idx = current_order.index(var_name)
-                    if idx > 0:
-                        current_order[idx], current_order[idx-1] = current_order[idx-1], current_order[idx]
-                        st.session_state.label_config['variable_order'] = current_order
-                        st.rerun()
-            
-            if index < len(current_order) - 1 and st.button("↓", key=f"down_{var_name}_{index}"):
-                if var_name in current_order:
-                    idx = current_order.index(var_name)
-                    if idx < len(current_order) - 1:
-                        current_order[idx], current_order[idx+1] = current_order[idx+1], current_order[idx]
-                        st.session_state.label_config['variable_order'] = current_order
-                        st.rerun()
-        
-        # Variable name and sample
-        with col2:
-            st.write(f"**{var_name}**")
-            if var_name in df.columns:
-                sample_values = df[var_name].dropna().head(2).tolist()
-                sample_text = ', '.join([str(v)[:15] for v in sample_values])
-                st.caption(f"Sample: {sample_text}")
-        
-        # Font size with unique keys
-        with col3:
-            current_settings = st.session_state.label_config['variable_settings'].get(var_name, {})
-            font_size = st.slider(
-                "Font Size",
-                min_value=8,
-                max_value=24,
-                value=current_settings.get('font_size', 12),
-                key=f"font_{var_name}_{index}"
-            )
-        
-        # Style with unique keys
-        with col4:
-            style = st.selectbox(
-                "Style",
-                ["Normal", "Bold"],
-                index=0 if current_settings.get('style', 'Normal') == 'Normal' else 1,
-                key=f"style_{var_name}_{index}"
-            )
-        
-        # New Line option
-        with col5:
-            new_line = st.checkbox(
+def render_variable_reorder(variable_order, selected_vars):
+    """Render a single reorder editor for the selected variables"""
+    ordered = [var for var in variable_order if var in selected_vars]
+    if not ordered:
+        return
+
+    # One editable table replaces the per-variable ↑/↓ button rows, where
+    # every click forced a full-page rerun: an arbitrary reorder now costs
+    # a single rerun instead of one per swap
+    st.caption("Display order (edit the rows to reorder):")
+    edited = st.data_editor(
+        pd.DataFrame({'variable': ordered}),
+        num_rows="fixed",
+        use_container_width=True,
+        key="order_editor"
+    )
+
+    # Keep only known names, drop duplicates, and append anything the edit
+    # lost so a typo can't make a variable vanish
+    new_order = []
+    for var in edited['variable'].tolist():
+        if var in selected_vars and var not in new_order:
+            new_order.append(var)
+    for var in ordered:
+        if var not in new_order:
+            new_order.append(var)
+
+    if new_order != ordered:
+        st.session_state.label_config['variable_order'] = new_order
+
+def render_variable_settings_editor(variable_order, selected_vars, samples):
+    """Render all per-variable settings as one data_editor (runs inside
+    the form) and return the edited settings keyed by variable name"""
+    current_settings = st.session_state.label_config['variable_settings']
+    rows = [{
+        'variable': var_name,
+        'sample': samples.get(var_name, ''),
+        'font_size': current_settings.get(var_name, {}).get('font_size', 12),
+        'style': current_settings.get(var_name, {}).get('style', 'Normal'),
+        'new_line': current_settings.get(var_name, {}).get('new_line', True),
+    } for var_name in variable_order if var_name in selected_vars]
+
+    edited = st.data_editor(
+        pd.DataFrame(rows),
+        column_config={
+            'variable': st.column_config.TextColumn("Variable", disabled=True),
+            'sample': st.column_config.TextColumn("Sample", disabled=True),
+            'font_size': st.column_config.NumberColumn(
+                "Font Size", min_value=8, max_value=24, step=1),
+            'style': st.column_config.SelectboxColumn(
+                "Style", options=["Normal", "Bold"], required=True),
+            'new_line': st.column_config.CheckboxColumn(
                 "New Line",
-                value=current_settings.get('new_line', True),
-                key=f"newline_{var_name}_{index}",
-                help="Uncheck to display on same line as previous variable"
-            )
-        
-        # Save settings
-        if var_name not in st.session_state.label_config['variable_settings']:
-            st.session_state.label_config['variable_settings'][var_name] = {}
-        
-        st.session_state.label_config['variable_settings'][var_name].update({
-            'font_size': font_size,
-            'style': style,
-            'new_line': new_line
-        })
-        
-        st.markdown('</div>', unsafe_allow_html=True)
+                help="Uncheck to display on same line as previous variable"),
+        },
+        hide_index=True,
+        num_rows="fixed",
+        use_container_width=True,
+        key="variable_settings_editor"
+    )
 
+    return {row['variable']: {
+        'font_size': int(row['font_size']) if _notna(row['font_size']) else 12,
+        'style': row['style'],
+        'new_line': bool(row['new_line'])
+    } for row in edited.to_dict('records')}
+
+# Fragment: barcode widget tweaks rerun only this section instead of the
+# whole page (upload parsing, variable form, preview all stay untouched)
+@st.fragment
 def render_barcode_config(selected_vars):
     """Render barcode configuration section"""
     st.write("Choose which variable should be converted to a barcode:")
@@ -583,6 +692,40 @@ def render_barcode_config(selected_vars):
                     }
                     st.rerun()
 
+# Logos are composited at <=150 px on the label, so anything bigger than
+# this per side is wasted decode + blend work downstream
+_LOGO_MAX_SIDE = 512
+
+@st.cache_data(show_spinner=False)
+def _normalize_logo(raw):
+    """Canonical RGBA PNG bytes for an uploaded logo (cached)"""
+    logo_image = Image.open(io.BytesIO(raw))
+
+    # Already canonical: skip the expensive libpng re-encode entirely
+    if (logo_image.format == 'PNG' and logo_image.mode == 'RGBA'
+            and max(logo_image.size) <= _LOGO_MAX_SIDE):
+        return raw
+
+    # Convert to RGBA to handle transparency
+    if logo_image.mode != 'RGBA':
+        logo_image = logo_image.convert('RGBA')
+
+    # Shrink camera-resolution uploads so compositing works on a small image
+    logo_image.thumbnail((_LOGO_MAX_SIDE, _LOGO_MAX_SIDE))
+
+    logo_buffer = io.BytesIO()
+    logo_image.save(logo_buffer, format='PNG')
+    return logo_buffer.getvalue()
+
+@st.cache_data(show_spinner=False)
+def _logo_meta(raw):
+    """(width, height, format, mode) of an uploaded logo (cached)"""
+    logo_image = Image.open(io.BytesIO(raw))
+    return logo_image.width, logo_image.height, logo_image.format, logo_image.mode
+
+# Fragment for the same reason as render_barcode_config: logo uploads and
+# position tweaks are isolated from the rest of the page's rerun cost
+@st.fragment
 def render_logo_config():
     """Render logo configuration section"""
     st.write("Add a company logo to your labels:")
@@ -615,19 +758,14 @@ def render_logo_config():
         
         if uploaded_logo is not None:
             try:
-                # Read and process the image
-                logo_image = Image.open(uploaded_logo)
-                
-                # Convert to RGBA to handle transparency
-                if logo_image.mode != 'RGBA':
-                    logo_image = logo_image.convert('RGBA')
-                
-                # Save image data to session state
-                logo_buffer = io.BytesIO()
-                logo_image.save(logo_buffer, format='PNG')
-                logo_buffer.seek(0)
-                
-                st.session_state.label_config['logo_settings']['image_data'] = logo_buffer.getvalue()
+                # Normalize + inspect through cached helpers so reruns
+                # don't redo the PIL decode/encode round-trip per widget
+                # interaction
+                raw = uploaded_logo.getvalue()
+                logo_bytes = _normalize_logo(raw)
+                logo_w, logo_h, logo_format, logo_mode = _logo_meta(raw)
+
+                st.session_state.label_config['logo_settings']['image_data'] = logo_bytes
                 st.session_state.label_config['logo_settings']['enabled'] = True
                 
                 st.success(f"✅ Logo uploaded: {uploaded_logo.name}")
@@ -636,13 +774,13 @@ def render_logo_config():
                 col_preview, col_info = st.columns([1, 1])
                 with col_preview:
                     st.write("**Logo Preview:**")
-                    st.image(logo_image, width=100)
+                    st.image(logo_bytes, width=100)
                 
                 with col_info:
                     st.write("**Logo Info:**")
-                    st.write(f"• Size: {logo_image.width} × {logo_image.height} px")
-                    st.write(f"• Format: {logo_image.format}")
-                    st.write(f"• Mode: {logo_image.mode}")
+                    st.write(f"• Size: {logo_w} × {logo_h} px")
+                    st.write(f"• Format: {logo_format}")
+                    st.write(f"• Mode: {logo_mode}")
                     
             except Exception as e:
                 st.error(f"Error processing logo: {str(e)}")
@@ -651,16 +789,14 @@ def render_logo_config():
         elif current_logo_settings.get('image_data') is not None:
             st.info("✅ Logo already uploaded and ready to use")
             
-            # Show current logo
+            # Show current logo (st.image takes the PNG bytes directly)
             try:
                 logo_data = current_logo_settings['image_data']
-                logo_buffer = io.BytesIO(logo_data)
-                current_logo = Image.open(logo_buffer)
                 
                 col_current, col_replace = st.columns([1, 1])
                 with col_current:
                     st.write("**Current Logo:**")
-                    st.image(current_logo, width=100)
+                    st.image(logo_data, width=100)
                 
                 with col_replace:
                     if st.button("🔄 Replace Logo"):
@@ -709,9 +845,7 @@ def render_logo_config():
             # Save logo settings
             st.session_state.label_config['logo_settings'] = {
                 'enabled': True,
-                'image_data': current_logo_settings.get('image_data') or (
-                    logo_buffer.getvalue() if uploaded_logo is not None else None
-                ),
+                'image_data': current_logo_settings.get('image_data'),
                 'position': logo_position,
                 'size': logo_size,
                 'margin': logo_margin
@@ -751,22 +885,24 @@ def preview_design_page():
     """Preview label design with real data"""
     st.markdown('<div class="step-header"><h2>Step 3: Preview & Design</h2></div>', unsafe_allow_html=True)
     
-    if st.session_state.uploaded_data is None:
+    if _full_data() is None:
         st.warning("⚠️ Please upload your Excel data first!")
         return
-    
+
     if not st.session_state.label_config['selected_variables']:
         st.warning("⚠️ Please configure your label variables first!")
         return
-    
+
     col1, col2 = st.columns([1, 1])
     
     with col1:
         st.subheader("Live Preview")
         
         try:
+            # PNG bytes from the session cache; nothing to re-encode when
+            # the config and data haven't changed
             preview_image = create_preview_label()
-            st.image(preview_image, caption="Preview with Real Data", use_column_width=True)
+            st.image(preview_image, caption="Preview with Real Data", use_container_width=True)
             
             # Show barcode status
             barcode_var = st.session_state.label_config.get('barcode_variable', '')
@@ -825,85 +961,121 @@ def preview_design_page():
         
         # Global adjustments
         st.subheader("Quick Adjustments")
-        
+
+        def _bump_fonts(delta, lo=8, hi=24):
+            # Shared by both buttons; only pay for a rerun if a size
+            # actually moved (all-min or all-max clicks are free)
+            settings = config['variable_settings']
+            changed = False
+            for var in config['selected_variables']:
+                current = settings.setdefault(var, {}).get('font_size', 12)
+                bumped = max(lo, min(hi, current + delta))
+                if bumped != current:
+                    settings[var]['font_size'] = bumped
+                    changed = True
+            if changed:
+                st.rerun()
+
         col_up, col_down = st.columns(2)
         with col_up:
             if st.button("📈 Increase All Fonts"):
-                for var in config['selected_variables']:
-                    if var not in config['variable_settings']:
-                        config['variable_settings'][var] = {}
-                    current = config['variable_settings'][var].get('font_size', 12)
-                    config['variable_settings'][var]['font_size'] = min(24, current + 2)
-                st.rerun()
-        
+                _bump_fonts(+2)
+
         with col_down:
             if st.button("📉 Decrease All Fonts"):
-                for var in config['selected_variables']:
-                    if var not in config['variable_settings']:
-                        config['variable_settings'][var] = {}
-                    current = config['variable_settings'][var].get('font_size', 12)
-                    config['variable_settings'][var]['font_size'] = max(8, current - 2)
-                st.rerun()
+                _bump_fonts(-2)
+
+@st.cache_data(show_spinner=False)
+def build_preview_label(config, first_row):
+    """Render the preview label (cached on config + first data row)"""
+    # Use the same logic as production labels
+    return create_label_from_data(first_row, config)
 
 def create_preview_label():
     """Create preview label with real data from first row"""
     config = st.session_state.label_config
-    width = config['label_dimensions']['width']
-    height = config['label_dimensions']['height']
-    
-    df = st.session_state.uploaded_data
+
+    df = _full_data()
     if df is None or len(df) == 0:
         return create_empty_label()
-    
+
     first_row = df.iloc[0]
-    
-    # Use the same logic as production labels
-    return create_label_from_data(first_row)
+
+    # Cheap fingerprint of (config, first row): reruns that change neither
+    # skip even st.cache_data's parameter hashing and reuse the image held
+    # in session state
+    key = hashlib.blake2b(
+        json.dumps(config, sort_keys=True, default=str).encode()
+        + first_row.to_json().encode(),
+        digest_size=16).digest()
+    if st.session_state.get('preview_key') == key and 'preview_image' in st.session_state:
+        return st.session_state['preview_image']
+
+    # Cached: widget interactions that don't change the config or data
+    # reuse the previously rendered image. Stored as PNG bytes so st.image
+    # forwards them as-is instead of re-encoding a PIL image every rerun
+    image = build_preview_label(config, first_row)
+    buffer = io.BytesIO()
+    # Same fast encode flags as the batch path; the browser doesn't care
+    # about a few hundred extra bytes on a preview
+    image.save(buffer, format='PNG', compress_level=1, optimize=False)
+    st.session_state['preview_image'] = buffer.getvalue()
+    st.session_state['preview_key'] = key
+    return st.session_state['preview_image']
+
+@functools.lru_cache(maxsize=4096)
+def render_code128(barcode_str, module_width, module_height, quiet_zone):
+    """Render a Code 128 barcode image once per unique value (cached)"""
+    # Code128.build() exposes the bar pattern as a '1'/'0' module string;
+    # rasterizing that directly skips the ImageWriter's PNG encode + decode
+    # round-trip, which was the hottest per-label operation
+    pattern = barcode.Code128(barcode_str).build()[0]
+    modules = np.frombuffer(pattern.encode('ascii'), dtype=np.uint8) - ord('0')
+
+    # Match ImageWriter's geometry: module_width is in mm at 300 dpi
+    px_per_module = max(int(round(module_width * 300 / 25.4)), 1)
+    quiet = int(quiet_zone) * px_per_module
+
+    cols = np.repeat(np.where(modules == 1, 0, 255).astype(np.uint8), px_per_module)
+    cols = np.pad(cols, (quiet, quiet), constant_values=255)
+    arr = np.ascontiguousarray(np.broadcast_to(cols, (int(module_height), cols.size)))
+    return Image.fromarray(arr, 'L')
+
+@functools.lru_cache(maxsize=4096)
+def resized_code128(barcode_str, width, height, module_width, quiet_zone):
+    """Resized variant of the cached barcode render (cached separately)"""
+    barcode_img = render_code128(barcode_str, module_width, height, quiet_zone)
+    # NEAREST keeps bar edges hard: LANCZOS's 6-tap kernel costs ~10x more
+    # and its gray halos actually hurt scanner readability
+    return barcode_img.resize((width, height), Image.Resampling.NEAREST)
 
 def add_barcode_to_image(img, draw, barcode_data, width, height, config):
     """Add Code 128 barcode to the label image (used for preview)"""
     barcode_settings = config.get('barcode_settings', {})
     barcode_height = barcode_settings.get('height', 40)
     barcode_str = str(barcode_data)
-    
+
     # Position at bottom with more space
     barcode_y = height - barcode_height - 15
     barcode_width = width - 20
-    
+
     if BARCODE_AVAILABLE:
         try:
-            # Generate Code 128 barcode with higher DPI
-            code128 = barcode.get('code128', barcode_str, writer=ImageWriter())
-            
-            # Create barcode image with high quality
-            barcode_buffer = io.BytesIO()
-            # Write with options for better quality
-            barcode_img_raw = code128.render({
-                'module_width': 0.4,  # Thinner bars for better quality
-                'module_height': barcode_height,
-                'background': 'white',
-                'foreground': 'black',
-                'write_text': False,  # Don't include text in barcode image
-                'text_distance': 0,
-                'quiet_zone': 2
-            })
-            
-            # Save as high quality
-            barcode_img_raw.save(barcode_buffer, format='PNG', dpi=(300, 300))
-            barcode_buffer.seek(0)
-            
-            barcode_img = Image.open(barcode_buffer)
-            barcode_img = barcode_img.resize((barcode_width, barcode_height), Image.Resampling.LANCZOS)
-            
+            # Cached per unique value: repeated SKUs and rerun previews skip
+            # python-barcode's pure-Python render entirely. Same module
+            # width/quiet zone as the production path so preview and batch
+            # share cache entries (and look identical)
+            barcode_img = resized_code128(barcode_str, barcode_width, barcode_height, 0.25, 4)
+
             # Paste onto main image
             img.paste(barcode_img, (10, barcode_y))
-            
+
         except Exception:
             # Fallback to visual Code 128-style barcode
-            draw_visual_barcode(draw, 10, barcode_y, barcode_width, barcode_height, barcode_str)
+            draw_visual_barcode(img, draw, 10, barcode_y, barcode_width, barcode_height, barcode_str)
     else:
         # Draw visual Code 128-style barcode
-        draw_visual_barcode(draw, 10, barcode_y, barcode_width, barcode_height, barcode_str)
+        draw_visual_barcode(img, draw, 10, barcode_y, barcode_width, barcode_height, barcode_str)
     
     # Add text below if explicitly enabled
     if barcode_settings.get('show_text', False):
@@ -911,33 +1083,74 @@ def add_barcode_to_image(img, draw, barcode_data, width, height, config):
         if font:
             draw.text((15, barcode_y + barcode_height + 3), barcode_str, fill='black', font=font)
 
-def draw_visual_barcode(draw, x, y, width, height, data):
+if NUMBA_AVAILABLE:
+    @numba.njit(cache=True)
+    def _visual_barcode_mask(char_codes, width, height, bar_count, bar_width):
+        """Bar mask for the visual barcode fallback (JIT-compiled)"""
+        mask = np.zeros((height + 1, width + 1), dtype=np.uint8)
+        n_chars = char_codes.shape[0]
+        for i in range(bar_count):
+            code = char_codes[i % n_chars]
+            if (code + i) % 3 == 0:
+                continue
+            if code % 4 == 0:
+                bar_height = height - 8
+            elif code % 3 == 0:
+                bar_height = height - 12
+            else:
+                bar_height = height - 6
+            x_start = 10 + i * bar_width
+            for col in range(x_start, min(x_start + bar_width, width + 1)):
+                for row in range(4, min(4 + bar_height, height) + 1):
+                    mask[row, col] = 255
+        return mask
+
+    # Compile (or load from the on-disk JIT cache) at import so the first
+    # rendered label doesn't pay the compilation cost
+    _visual_barcode_mask(np.frombuffer(b'0', dtype=np.uint8), 20, 20, 4, 2)
+else:
+    def _visual_barcode_mask(char_codes, width, height, bar_count, bar_width):
+        """Bar mask for the visual barcode fallback (NumPy version)"""
+        idx = np.arange(bar_count)
+        codes = char_codes[idx % char_codes.shape[0]]
+
+        # Vary bar heights
+        bar_heights = np.where(codes % 4 == 0, height - 8,
+                      np.where(codes % 3 == 0, height - 12, height - 6))
+
+        # Draw bars with pattern
+        keep = (codes + idx) % 3 != 0
+
+        # Map each pixel column of the barcode area to its bar index (or -1)
+        col_bar = np.full(width + 1, -1)
+        span = min(bar_count * bar_width, width + 1 - 10)
+        col_bar[10:10 + span] = np.repeat(idx, bar_width)[:span]
+        valid = col_bar >= 0
+
+        col_keep = np.zeros(width + 1, dtype=bool)
+        col_keep[valid] = keep[col_bar[valid]]
+        col_height = np.zeros(width + 1, dtype=np.int64)
+        col_height[valid] = bar_heights[col_bar[valid]]
+
+        rows = np.arange(height + 1)[:, None]
+        mask = (rows >= 4) & (rows <= 4 + col_height) & col_keep
+        return mask.astype(np.uint8) * 255
+
+def draw_visual_barcode(img, draw, x, y, width, height, data):
     """Draw visual representation of barcode"""
     # Background
     draw.rectangle([x, y, x + width, y + height], fill='white', outline='black', width=2)
-    
-    # Generate bars based on data
+
+    # Generate bars based on data: compute every bar's column range and
+    # height in the kernel above and blit them in a single paste instead
+    # of one draw.rectangle call per bar
     data_str = str(data)
     bar_count = min(len(data_str) * 4, 50)
     bar_width = max(2, (width - 20) // bar_count)
-    
-    for i in range(bar_count):
-        char_idx = i % len(data_str)
-        char_code = ord(data_str[char_idx])
-        
-        # Vary bar heights
-        if char_code % 4 == 0:
-            bar_height = height - 8
-        elif char_code % 3 == 0:
-            bar_height = height - 12
-        else:
-            bar_height = height - 6
-        
-        x_pos = x + 10 + (i * bar_width)
-        
-        # Draw bars with pattern
-        if (char_code + i) % 3 != 0:
-            draw.rectangle([x_pos, y + 4, x_pos + bar_width - 1, y + 4 + bar_height], fill='black')
+
+    char_codes = np.frombuffer(data_str.encode('utf-8'), dtype=np.uint8)
+    mask = _visual_barcode_mask(char_codes, width, height, bar_count, bar_width)
+    img.paste('black', (x, y), Image.fromarray(mask, 'L'))
 
 def load_font(size):
     """Load font with fallback - alias for compatibility"""
@@ -955,7 +1168,7 @@ def create_empty_label():
     
     font = load_font(16)
     if font:
-        draw.text((width//2 - 50, height//2), "No data", fill='gray', font=font)
+        draw.text((width//2, height//2), "No data", fill='gray', font=font, anchor='mm')
     
     return img
 
@@ -963,16 +1176,15 @@ def generate_labels_page():
     """Generate final labels"""
     st.markdown('<div class="step-header"><h2>Step 4: Generate Labels</h2></div>', unsafe_allow_html=True)
     
-    if st.session_state.uploaded_data is None:
+    df = _full_data()
+    if df is None:
         st.warning("⚠️ Upload data first!")
         return
-    
+
     if not st.session_state.label_config['selected_variables']:
         st.warning("⚠️ Configure variables first!")
         return
-    
-    df = st.session_state.uploaded_data
-    
+
     st.write(f"**Ready to generate {len(df)} labels**")
     
     # Range selection
@@ -1018,101 +1230,329 @@ def generate_labels_page():
             except Exception as e:
                 st.error(f"❌ Error: {str(e)}")
 
+def _render_label_bytes(args):
+    """Render one label row to PNG bytes (runs in a worker process)"""
+    row_data, config, plan = args
+    try:
+        label_img = create_label_from_data(row_data, config, plan, reuse_canvas=True)
+
+        # Labels use a handful of colors (black text/bars, white ground,
+        # antialias grays, maybe a logo), so an 8-bit palette feeds zlib a
+        # third of the bytes; 64 entries keeps the quantization invisible
+        label_img = label_img.convert('P', palette=Image.ADAPTIVE, colors=64)
+
+        img_buffer = io.BytesIO()
+        # Fast zlib level and no palette-optimization scan: labels are mostly
+        # flat black-on-white, where the extra encode effort buys nothing
+        label_img.save(img_buffer, format='PNG', compress_level=1, optimize=False)
+        return img_buffer.getvalue(), None
+    except Exception as e:
+        return None, str(e)
+
 def generate_png_labels(df):
-    """Generate PNG labels and return ZIP"""
-    zip_buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for index, row in df.iterrows():
+    """Generate PNG labels in parallel and return ZIP"""
+    # Labels are independent, so fan the PIL/zlib-bound rendering out to a
+    # process pool (bypasses the GIL) and stream results into the ZIP here
+    config = st.session_state.label_config
+
+    # Spool the archive to a temp file once it outgrows 64 MB so the
+    # writing phase never holds the whole ZIP in a BytesIO; the finished
+    # bytes are read back once at the end for st.download_button, which
+    # only accepts str/bytes/file-reader types — not a SpooledTemporaryFile
+    zip_buffer = tempfile.SpooledTemporaryFile(max_size=64 << 20)
+
+    # PNG payloads are already deflate-compressed, so store them as-is
+    # instead of paying for a second zlib pass per label
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_STORED) as zip_file:
+        # Only the configured variables (plus the barcode column) ever
+        # reach the renderer, so drop the rest before stringifying
+        key_cols = [v for v in config.get('variable_order', [])
+                    if v in config.get('selected_variables', []) and v in df.columns]
+        barcode_var = config.get('barcode_variable', '')
+        if barcode_var and barcode_var in df.columns and barcode_var not in key_cols:
+            key_cols.append(barcode_var)
+
+        # Stringify the needed columns column-wise in C once instead of
+        # str()-ing every cell inside the per-label loops; where() keeps
+        # NaNs as NaN so the notna checks still skip missing values.
+        # Plain dicts skip the per-row Series construction of iterrows()
+        # and pickle much faster on their way to the workers
+        needed = df[key_cols]
+        records = needed.astype(str).where(needed.notna()).to_dict('records')
+
+        # Layout constants depend only on the config — build them once for
+        # the whole batch instead of once per row in the workers
+        plan = build_layout_plan(config)
+
+        # Rows with identical label content produce identical PNGs, so
+        # render one representative per unique combination of the
+        # configured variables (plus barcode) and reuse the bytes
+        keys = [tuple(rec.get(c) for c in key_cols) for rec in records]
+
+        first_seen = {}
+        for i, key in enumerate(keys):
+            first_seen.setdefault(key, i)
+
+        # Drain the process pool from a background thread so this (Streamlit)
+        # thread stays free to update the progress bar while workers render
+        result_queue = queue.Queue(maxsize=64)
+
+        def _producer():
             try:
-                # Create label image
-                label_img = create_label_from_data(row)
-                
-                # Save to buffer
-                img_buffer = io.BytesIO()
-                label_img.save(img_buffer, format='PNG')
-                img_buffer.seek(0)
-                
-                # Add to ZIP
-                filename = f"label_{index + 1:04d}.png"
-                zip_file.writestr(filename, img_buffer.getvalue())
-                
-            except Exception as e:
-                st.warning(f"Skipped label {index + 1}: {str(e)}")
-                continue
-    
+                with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                    results = executor.map(
+                        _render_label_bytes,
+                        ((records[i], config, plan) for i in first_seen.values()),
+                        chunksize=32)
+                    for key, result in zip(first_seen.keys(), results):
+                        result_queue.put((key, result))
+            finally:
+                result_queue.put(None)
+
+        producer = threading.Thread(target=_producer, daemon=True)
+        producer.start()
+
+        def _write_member(index, key):
+            png_bytes, error = rendered.get(key, (None, "render worker failed"))
+            if error is not None:
+                st.warning(f"Skipped label {index + 1}: {error}")
+                return
+
+            # Stream straight into the archive: writestr would route the
+            # payload through an intermediate ZipInfo + encode pass per call
+            zinfo = zipfile.ZipInfo(f"label_{index + 1:04d}.png")
+            zinfo.compress_type = zipfile.ZIP_STORED
+            with zip_file.open(zinfo, 'w', force_zip64=False) as member:
+                member.write(png_bytes)
+
+        progress_bar = st.progress(0.0)
+        rendered = {}
+        n_unique = max(len(first_seen), 1)
+        row_keys = list(zip(df.index, keys))
+        write_pos = 0
+        while True:
+            item = result_queue.get()
+            if item is None:
+                break
+            key, result = item
+            rendered[key] = result
+            progress_bar.progress(len(rendered) / n_unique)
+
+            # Interleave archive writes with rendering: results come back
+            # in first-occurrence order, so each arrival usually unblocks
+            # the next run of rows (including the ones reusing its key)
+            while write_pos < len(row_keys) and row_keys[write_pos][1] in rendered:
+                _write_member(*row_keys[write_pos])
+                write_pos += 1
+        producer.join()
+        progress_bar.empty()
+
+        # Flush whatever is left; only non-empty if a worker died without
+        # delivering a result, in which case the rows are warned and skipped
+        for index, key in row_keys[write_pos:]:
+            _write_member(index, key)
+
     zip_buffer.seek(0)
-    return zip_buffer.getvalue()
+    zip_data = zip_buffer.read()
+    zip_buffer.close()
+    return zip_data
 
-def create_label_from_data(row_data):
-    """Create high-quality label image from row data"""
-    config = st.session_state.label_config
+# Glyph metrics depend only on (text, font), not on the draw target, so
+# identical strings across labels in a batch skip the FreeType shaping call
+_textlen_cache = {}
+
+def _text_length(draw, text, font):
+    """Memoized draw.textlength"""
+    key = (text, id(font))
+    length = _textlen_cache.get(key)
+    if length is None:
+        if len(_textlen_cache) > 4096:
+            _textlen_cache.clear()
+        length = _textlen_cache.setdefault(key, draw.textlength(text, font=font))
+    return length
+
+def _fit_prefix(draw, text, font, max_w):
+    """Longest '...'-terminated prefix of text that fits in max_w pixels.
+
+    Binary search on the prefix length measures O(log n) widths instead of
+    guessing from an average character width and re-trimming; with the
+    memoized _text_length the probes are nearly free on repeated values.
+    """
+    lo, hi = 1, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if _text_length(draw, text[:mid] + "...", font) <= max_w:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + "..."
+
+@functools.lru_cache(maxsize=8)
+def _label_template(width, height, border_width):
+    """Blank label canvas (background + border), shared across rows.
+
+    Every label in a batch starts from the same white rectangle with the
+    same border, so draw it once per process and hand out copies —
+    Image.copy() is a single memcpy in PIL's C layer.
+    """
+    img = Image.new('RGB', (width, height), color='white')
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([border_width, border_width, width - border_width, height - border_width],
+                   outline='black', width=border_width)
+    return img
+
+def build_layout_plan(config):
+    """Precompute the layout constants that depend only on the config.
+
+    Everything here is identical for every row in a generation batch, so
+    computing it once strips the per-variable dict lookups and arithmetic
+    from the per-row hot path. The plan is a plain dict of primitives, so
+    it pickles cheaply alongside each worker task.
+    """
+    # Render at final resolution: 4x supersampling meant 16x the pixel
+    # writes per label, and hinted TrueType rendering at native size is
+    # visually equivalent for label text
+    scale_factor = 2 if HQ_MODE else 1
     width = config['label_dimensions']['width']
     height = config['label_dimensions']['height']
-    
-    # Create even higher resolution image for maximum clarity
-    scale_factor = 4  # Increased from 3x to 4x for better clarity
     high_width = width * scale_factor
     high_height = height * scale_factor
-    
-    # Create high-res image
-    img = Image.new('RGB', (high_width, high_height), color='white')
-    draw = ImageDraw.Draw(img)
-    
-    # Draw border (scaled)
-    border_width = 3 * scale_factor  # Thicker border for better definition
-    draw.rectangle([border_width, border_width, high_width-border_width, high_height-border_width], 
-                   outline='black', width=border_width)
-    
-    y_offset = 20 * scale_factor  # More top margin
+
     barcode_variable = config.get('barcode_variable', '')
-    
+
     # Calculate available height for text (reserve more space for barcode + text + margin)
     barcode_height = config['barcode_settings']['height'] * scale_factor
     barcode_text_space = 20 * scale_factor if config['barcode_settings'].get('show_text', False) else 0
     bottom_margin = 20 * scale_factor  # Extra space after barcode text
-    
+
     reserved_bottom_space = barcode_height + barcode_text_space + bottom_margin + (20 * scale_factor)
-    available_height = high_height - reserved_bottom_space
-    
+
+    text_vars = []
+    for var in config['variable_order']:
+        if var in config['selected_variables'] and var != barcode_variable:
+            settings = config['variable_settings'].get(var, {})
+            text_vars.append({
+                'name': var,
+                # Abbreviated once here instead of re-scanning per row
+                'short_name': var.replace('_', ' ').replace('Manufacturer', 'Mfg').replace('Product', 'Prod'),
+                'font_size': settings.get('font_size', 12) * scale_factor,
+                'new_line': settings.get('new_line', True),
+            })
+
+    return {
+        'scale_factor': scale_factor,
+        'width': width,
+        'height': height,
+        'high_width': high_width,
+        'high_height': high_height,
+        'border_width': 3 * scale_factor,  # Thicker border for better definition
+        'max_width': high_width - (40 * scale_factor),
+        'available_height': high_height - reserved_bottom_space,
+        'barcode_variable': barcode_variable,
+        # Barcode settings resolved once here; the per-row barcode pass
+        # reads these instead of chasing nested config dicts per label
+        'barcode_height': barcode_height,
+        'barcode_show_text': config['barcode_settings'].get('show_text', False),
+        'barcode_font_size': config['barcode_settings'].get('font_size', 10) * scale_factor,
+        'text_vars': text_vars,
+    }
+
+@functools.lru_cache(maxsize=2048)
+def _text_line_mask(text, font_size):
+    """Alpha mask for one rendered text line plus its anchor offsets.
+
+    Batches redraw the same SKU/price strings constantly; rasterizing a
+    line once and blitting it with paste() turns the repeated per-glyph
+    draw.text work into a single C-level masked fill per line.
+    """
+    font = load_high_quality_font(font_size)
+    left, top, right, bottom = font.getbbox(text, anchor='ma')
+    mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)), 0)
+    ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font, anchor='ma')
+    return mask, left, top
+
+def _notna(value):
+    """Cheap scalar stand-in for pd.notna on row values.
+
+    The rows reaching the render path are plain dicts (or a single Series
+    for the preview); a None/NaN identity check avoids dispatching through
+    pandas' generic missing-value machinery once per variable per label.
+    """
+    return value is not None and value == value
+
+# Reusable canvas for sequential in-process rendering (see below); never
+# shared across processes, each pool worker owns its own copy
+_scratch_canvas = None
+
+def create_label_from_data(row_data, config, plan=None, reuse_canvas=False):
+    """Create high-quality label image from row data"""
+    if plan is None:
+        plan = build_layout_plan(config)
+
+    scale_factor = plan['scale_factor']
+    high_width = plan['high_width']
+    high_height = plan['high_height']
+
+    # Start from the cached blank template instead of re-allocating and
+    # re-drawing the border for every row
+    template = _label_template(high_width, high_height, plan['border_width'])
+    if reuse_canvas:
+        # Batch rendering is sequential within a worker, so one canvas can
+        # be recycled: paste() resets it to the template in C without a
+        # fresh malloc + first-touch per row. Callers must consume the
+        # returned image before the next render on this process.
+        global _scratch_canvas
+        if _scratch_canvas is None or _scratch_canvas.size != template.size:
+            _scratch_canvas = template.copy()
+        else:
+            _scratch_canvas.paste(template, (0, 0))
+        img = _scratch_canvas
+    else:
+        img = template.copy()
+    draw = ImageDraw.Draw(img)
+
+    barcode_variable = plan['barcode_variable']
+    available_height = plan['available_height']
+    max_width = plan['max_width']
+
     # Group variables into lines based on new_line setting
     text_lines = []
     current_line = []
-    
-    for var in config['variable_order']:
-        if var in config['selected_variables'] and var != barcode_variable:
-            if var in row_data and pd.notna(row_data[var]):
-                settings = config['variable_settings'].get(var, {})
-                font_size = settings.get('font_size', 12) * scale_factor
-                new_line = settings.get('new_line', True)
-                
-                # Load high-quality font
-                font = load_high_quality_font(font_size)
-                if font is None:
-                    continue
-                
-                # Create text with better formatting
-                value = str(row_data[var])
-                text = f"{var}: {value}"
-                
-                # If this variable should start a new line, save current line and start new
-                if new_line and current_line:
-                    text_lines.append(current_line)
-                    current_line = []
-                
-                current_line.append({
-                    'text': text,
-                    'font': font,
-                    'font_size': font_size,
-                    'var_name': var,
-                    'value': value
-                })
-                
-                # If this variable should start a new line, close the current line
-                if new_line:
-                    text_lines.append(current_line)
-                    current_line = []
-    
+
+    for spec in plan['text_vars']:
+        var = spec['name']
+        if var in row_data and _notna(row_data[var]):
+            font_size = spec['font_size']
+            new_line = spec['new_line']
+
+            # Load high-quality font
+            font = load_high_quality_font(font_size)
+            if font is None:
+                continue
+
+            # Create text with better formatting
+            value = str(row_data[var])
+            text = f"{var}: {value}"
+
+            # If this variable should start a new line, save current line and start new
+            if new_line and current_line:
+                text_lines.append(current_line)
+                current_line = []
+
+            current_line.append({
+                'text': text,
+                'font': font,
+                'font_size': font_size,
+                'var_name': var,
+                'short_name': spec['short_name'],
+                'value': value
+            })
+
+            # If this variable should start a new line, close the current line
+            if new_line:
+                text_lines.append(current_line)
+                current_line = []
+
     # Add any remaining variables in current_line
     if current_line:
         text_lines.append(current_line)
@@ -1131,34 +1571,30 @@ def create_label_from_data(row_data):
             font_size = item['font_size']
             
             # Smart truncation for single items
-            text_width = draw.textlength(text, font=font)
-            max_width = high_width - (40 * scale_factor)
-            
+            text_width = _text_length(draw, text, font)
+
             if text_width > max_width:
-                # Abbreviate variable names
-                short_var = item['var_name'].replace('_', ' ').replace('Manufacturer', 'Mfg').replace('Product', 'Prod')
+                # Abbreviate variable names (precomputed in the plan)
+                short_var = item['short_name']
                 text = f"{short_var}: {item['value']}"
-                text_width = draw.textlength(text, font=font)
-                
+                text_width = _text_length(draw, text, font)
+
                 if text_width > max_width:
-                    avg_char_width = text_width / len(text)
-                    max_chars = int(max_width / avg_char_width) - 3
-                    
-                    if len(text) > max_chars:
-                        if ',' in item['value'] and len(f"{short_var}: {item['value'].split(',')[0]}...") <= max_chars:
-                            text = f"{short_var}: {item['value'].split(',')[0]}..."
-                        else:
-                            text = text[:max_chars] + "..."
+                    # Prefer the first comma-separated chunk when it fits
+                    candidate = f"{short_var}: {item['value'].split(',')[0]}..." if ',' in item['value'] else None
+                    if candidate is not None and _text_length(draw, candidate, font) <= max_width:
+                        text = candidate
+                    else:
+                        text = _fit_prefix(draw, text, font, max_width)
             
-            processed_lines.append([(text, font, font_size)])
+            processed_lines.append((text, font, font_size))
             
         else:
             # Multiple items on same line - create compact format
             line_items = []
             for item in line:
-                # Use shorter format for inline items
-                short_var = item['var_name'].replace('_', ' ').replace('Manufacturer', 'Mfg').replace('Product', 'Prod')
-                compact_text = f"{short_var}: {item['value']}"
+                # Use shorter format for inline items (precomputed in the plan)
+                compact_text = f"{item['short_name']}: {item['value']}"
                 line_items.append((compact_text, item['font'], item['font_size']))
             
             # Join with separator and check if fits
@@ -1170,9 +1606,8 @@ def create_label_from_data(row_data):
             max_font = load_high_quality_font(max_font_size)
             
             if max_font:
-                text_width = draw.textlength(combined_text, font=max_font)
-                max_width = high_width - (40 * scale_factor)
-                
+                text_width = _text_length(draw, combined_text, max_font)
+
                 if text_width > max_width:
                     # If too long, truncate values
                     truncated_items = []
@@ -1188,53 +1623,50 @@ def create_label_from_data(row_data):
                     
                     combined_text = separator.join([item[0] for item in truncated_items])
                 
-                processed_lines.append([(combined_text, max_font, max_font_size)])
+                processed_lines.append((combined_text, max_font, max_font_size))
     
     # Center all lines vertically
-    total_height = sum(max(item[2] for item in line) + (8 * scale_factor) for line in processed_lines)
+    total_height = sum(font_size + (8 * scale_factor) for _, _, font_size in processed_lines)
     start_y = (available_height - total_height) // 2 + (30 * scale_factor)
     
-    # Draw all lines
+    # Draw all lines from cached masks: anchor='ma' offsets keep the
+    # centering, and paste() blends the coverage mask exactly like
+    # draw.text would — but repeated strings skip rasterization entirely
+    center_x = high_width // 2
     current_y = start_y
-    for line in processed_lines:
-        for text, font, font_size in line:
-            # Center horizontally
-            text_width = draw.textlength(text, font=font)
-            x_pos = (high_width - text_width) // 2
-            
-            draw.text((x_pos, current_y), text, fill='black', font=font)
-            break  # Only one item per processed line
-        
-        max_font_size = max(item[2] for item in line)
-        current_y += max_font_size + (8 * scale_factor)
+    for text, font, font_size in processed_lines:
+        mask, dx, dy = _text_line_mask(text, font_size)
+        img.paste('black', (center_x + dx, current_y + dy), mask)
+        current_y += font_size + (8 * scale_factor)
     
     # Add barcode if configured (centered)
-    if barcode_variable and barcode_variable in row_data and pd.notna(row_data[barcode_variable]):
-        add_high_quality_barcode(img, draw, row_data[barcode_variable], high_width, high_height, config, scale_factor)
+    if barcode_variable and barcode_variable in row_data and _notna(row_data[barcode_variable]):
+        add_high_quality_barcode(img, draw, row_data[barcode_variable], high_width, high_height, plan)
     
     # Add logo if configured
     if config.get('logo_settings', {}).get('enabled', False):
         add_logo_to_image(img, high_width, high_height, config, scale_factor)
     
-    # Scale down to final size with highest quality resampling
-    final_img = img.resize((width, height), Image.Resampling.LANCZOS)
-    
-    return final_img
+    # Already rendered at the target size; no downscale pass needed
+    if (high_width, high_height) != (plan['width'], plan['height']):
+        img = img.resize((plan['width'], plan['height']), Image.Resampling.LANCZOS)
+
+    return img
 
-def add_high_quality_barcode(img, draw, barcode_data, width, height, config, scale_factor):
+def add_high_quality_barcode(img, draw, barcode_data, width, height, plan):
     """Add high-quality centered Code 128 barcode to scaled image"""
-    barcode_settings = config.get('barcode_settings', {})
-    barcode_height = barcode_settings.get('height', 40) * scale_factor
+    # All settings pre-resolved in the plan: no nested dict walks per row
+    scale_factor = plan['scale_factor']
+    barcode_height = plan['barcode_height']
     barcode_str = str(barcode_data)
-    show_text = barcode_settings.get('show_text', False)
-    
+    show_text = plan['barcode_show_text']
+
     # Calculate positioning with proper spacing
     bottom_margin = 20 * scale_factor  # Space after barcode text
     text_height = 0
-    
+
     if show_text:
-        font_size = barcode_settings.get('font_size', 10) * scale_factor
-        text_height = font_size + (8 * scale_factor)  # Text height + spacing
+        text_height = plan['barcode_font_size'] + (8 * scale_factor)  # Text height + spacing
     
     # Position barcode considering text and bottom margin
     barcode_y = height - barcode_height - text_height - bottom_margin - (10 * scale_factor)
@@ -1242,36 +1674,16 @@ def add_high_quality_barcode(img, draw, barcode_data, width, height, config, sca
     
     if BARCODE_AVAILABLE:
         try:
-            # Generate ultra-high-quality Code 128 barcode
-            code128 = barcode.get('code128', barcode_str, writer=ImageWriter())
-            
-            # Create barcode with maximum quality settings
-            barcode_buffer = io.BytesIO()
-            barcode_img_raw = code128.render({
-                'module_width': 0.25,  # Even thinner bars for crisp quality
-                'module_height': barcode_height // scale_factor,
-                'background': 'white',
-                'foreground': 'black',
-                'write_text': False,  # Never include text
-                'text_distance': 0,
-                'quiet_zone': 4,  # More quiet zone for better scanning
-                'dpi': 600  # Very high DPI
-            })
-            
-            # Save with maximum quality
-            barcode_img_raw.save(barcode_buffer, format='PNG', dpi=(600, 600))
-            barcode_buffer.seek(0)
-            
-            barcode_img = Image.open(barcode_buffer)
-            # Scale the barcode for high-res image
-            barcode_img = barcode_img.resize((barcode_width, barcode_height), Image.Resampling.LANCZOS)
-            
+            # Rasterized straight from the Code 128 module pattern and
+            # cached per unique value — no PNG encode/decode round-trip
+            barcode_img = resized_code128(barcode_str, barcode_width, barcode_height, 0.25, 4)
+
             # Center the barcode horizontally
             barcode_x = (width - barcode_width) // 2
-            
+
             # Paste onto main image
             img.paste(barcode_img, (barcode_x, barcode_y))
-            
+
         except Exception:
             # Fallback to visual Code 128-style barcode (centered)
             barcode_x = (width - barcode_width) // 2
@@ -1283,76 +1695,97 @@ def add_high_quality_barcode(img, draw, barcode_data, width, height, config, sca
     
     # Add text below if explicitly enabled with proper spacing
     if show_text:
-        font = load_high_quality_font(barcode_settings.get('font_size', 10) * scale_factor)
+        font = load_high_quality_font(plan['barcode_font_size'])
         if font:
-            # Center the text below barcode with proper spacing
-            text_width = draw.textlength(barcode_str, font=font)
-            text_x = (width - text_width) // 2
+            # anchor='ma' centers in C using cached metrics, skipping the
+            # separate advance-width walk per label
             text_y = barcode_y + barcode_height + (8 * scale_factor)  # 8px gap between barcode and text
-            
-            draw.text((text_x, text_y), barcode_str, fill='black', font=font)
+            draw.text((width // 2, text_y), barcode_str, fill='black', font=font, anchor='ma')
+
+@functools.lru_cache(maxsize=256)
+def _scaled_barcode_mask(data_str, width, height):
+    """Pre-rendered bar mask for the scaled visual fallback (cached)"""
+    # Compute every bar's column range and height as NumPy arrays; the
+    # pattern is deterministic per (data, size), so repeated values across
+    # a batch reuse the finished mask
+    bar_count = min(len(data_str) * 4, 60)
+    bar_width = max(3, (width - 30) // bar_count)
+
+    idx = np.arange(bar_count)
+    char_codes = np.frombuffer(data_str.encode('utf-8'), dtype=np.uint8)[idx % len(data_str)]
+
+    # Vary bar heights
+    bar_heights = np.where(char_codes % 4 == 0, height - 12,
+                  np.where(char_codes % 3 == 0, height - 18, height - 9))
+
+    # Draw bars with pattern
+    keep = (char_codes + idx) % 3 != 0
+
+    # Map each pixel column of the bar area to its bar index (or -1);
+    # size the mask to the full bar span so edge clipping matches the
+    # rectangle calls, which also relied on PIL clipping at the image edge
+    mask_width = max(width + 1, 15 + bar_count * bar_width)
+    col_bar = np.full(mask_width, -1)
+    col_bar[15:15 + bar_count * bar_width] = np.repeat(idx, bar_width)
+    valid = col_bar >= 0
+
+    col_keep = np.zeros(mask_width, dtype=bool)
+    col_keep[valid] = keep[col_bar[valid]]
+    col_height = np.zeros(mask_width, dtype=np.int64)
+    col_height[valid] = bar_heights[col_bar[valid]]
+
+    rows = np.arange(height + 1)[:, None]
+    mask = (rows >= 6) & (rows <= 6 + col_height) & col_keep
+    return Image.fromarray(mask.astype(np.uint8) * 255, 'L')
 
 def draw_visual_barcode_scaled(draw, x, y, width, height, data):
     """Draw high-quality visual barcode for scaled image"""
     # Background
     draw.rectangle([x, y, x + width, y + height], fill='white', outline='black', width=3)
-    
-    # Generate bars
-    data_str = str(data)
-    bar_count = min(len(data_str) * 4, 60)
-    bar_width = max(3, (width - 30) // bar_count)
-    
-    for i in range(bar_count):
-        char_idx = i % len(data_str)
-        char_code = ord(data_str[char_idx])
-        
-        # Vary bar heights
-        if char_code % 4 == 0:
-            bar_height = height - 12
-        elif char_code % 3 == 0:
-            bar_height = height - 18
-        else:
-            bar_height = height - 9
-        
-        x_pos = x + 15 + (i * bar_width)
-        
-        # Draw bars with pattern
-        if (char_code + i) % 3 != 0:
-            draw.rectangle([x_pos, y + 6, x_pos + bar_width - 1, y + 6 + bar_height], fill='black')
+
+    # Blit the cached bar mask in a single bitmap call
+    draw.bitmap((x, y), _scaled_barcode_mask(str(data), width, height), fill='black')
+
+@functools.lru_cache(maxsize=16)
+def _prepared_logo(logo_data, logo_size):
+    """Decoded, RGBA-converted, aspect-fit logo image (cached)
+
+    The logo bytes and target size never change within a batch, so the
+    decode + LANCZOS resize happen once instead of once per label.
+    """
+    logo_img = Image.open(io.BytesIO(logo_data))
+
+    # Ensure logo has transparency support
+    if logo_img.mode != 'RGBA':
+        logo_img = logo_img.convert('RGBA')
+
+    # Resize logo maintaining aspect ratio
+    logo_aspect = logo_img.width / logo_img.height
+    if logo_aspect > 1:  # Wide logo
+        logo_width = int(logo_size)
+        logo_height = int(logo_size / logo_aspect)
+    else:  # Tall logo
+        logo_height = int(logo_size)
+        logo_width = int(logo_size * logo_aspect)
+
+    return logo_img.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
 
 def add_logo_to_image(img, width, height, config, scale_factor):
     """Add logo to label image at specified position"""
     logo_settings = config.get('logo_settings', {})
-    
+
     if not logo_settings.get('enabled', False) or not logo_settings.get('image_data'):
         return
-    
+
     try:
-        # Load logo from stored data
-        logo_data = logo_settings['image_data']
-        logo_buffer = io.BytesIO(logo_data)
-        logo_img = Image.open(logo_buffer)
-        
-        # Ensure logo has transparency support
-        if logo_img.mode != 'RGBA':
-            logo_img = logo_img.convert('RGBA')
-        
-        # Calculate logo size and position
-        logo_size = logo_settings.get('size', 50) * scale_factor
+        # Decode/resize through the cache; only the paste runs per label
+        logo_resized = _prepared_logo(logo_settings['image_data'],
+                                      logo_settings.get('size', 50) * scale_factor)
+        logo_width, logo_height = logo_resized.size
+
         margin = logo_settings.get('margin', 10) * scale_factor
         position = logo_settings.get('position', 'top-right')
-        
-        # Resize logo maintaining aspect ratio
-        logo_aspect = logo_img.width / logo_img.height
-        if logo_aspect > 1:  # Wide logo
-            logo_width = int(logo_size)
-            logo_height = int(logo_size / logo_aspect)
-        else:  # Tall logo
-            logo_height = int(logo_size)
-            logo_width = int(logo_size * logo_aspect)
-        
-        logo_resized = logo_img.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
-        
+
         # Calculate position coordinates
         if position == 'top-left':
             x = margin
@@ -1389,52 +1822,43 @@ def add_logo_to_image(img, width, height, config, scale_factor):
         # Silently fail if logo can't be added
         pass
 
+# First font name that loaded successfully; lets later sizes skip the
+# fallback scan and go straight to the known-good file
+_RESOLVED_FONT_NAME = None
+
+@functools.lru_cache(maxsize=64)
 def load_high_quality_font(size):
-    """Load high-quality font with multiple fallbacks"""
+    """Load high-quality font with multiple fallbacks (cached per size)"""
+    global _RESOLVED_FONT_NAME
+
+    if _RESOLVED_FONT_NAME is not None:
+        try:
+            return ImageFont.truetype(_RESOLVED_FONT_NAME, size)
+        except:
+            pass  # font disappeared mid-session; rescan below
+
     font_names = [
         "arial.ttf",
-        "Arial.ttf", 
+        "Arial.ttf",
         "helvetica.ttf",
         "Helvetica.ttf",
         "DejaVuSans.ttf",
         "liberation-sans.ttf"
     ]
-    
+
     for font_name in font_names:
         try:
-            return ImageFont.truetype(font_name, size)
+            font = ImageFont.truetype(font_name, size)
+            _RESOLVED_FONT_NAME = font_name
+            return font
         except:
             continue
-    
+
     # Final fallback
     try:
         return ImageFont.load_default()
     except:
         return None
-    for var in config['variable_order']:
-        if var in config['selected_variables'] and var != barcode_variable:
-            if var in row_data and pd.notna(row_data[var]):
-                settings = config['variable_settings'].get(var, {})
-                font_size = settings.get('font_size', 12)
-                
-                # Load font
-                font = load_font(font_size)
-                if font is None:
-                    continue
-                
-                # Create text
-                text = f"{var}: {row_data[var]}"
-                if len(text) > 45:
-                    text = text[:42] + "..."
-                
-                draw.text((10, y_offset), text, fill='black', font=font)
-                y_offset += font_size + 6
-    
-    # Add barcode if configured
-    if barcode_variable and barcode_variable in row_data and pd.notna(row_data[barcode_variable]):
-        add_barcode_to_image(img, draw, row_data[barcode_variable], width, height, config)
-    
-    return img
 
 def history_page():
     """Show generation history"""